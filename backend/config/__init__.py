@@ -5,3 +5,28 @@ SENTRY_DSN = ""
 MONGO_URI = ""
 USERS_COL = "youtube_downloader_users"
 USER_CACHE_TIME = 600
+FFMPEG_PATH = "ffmpeg"
+TRANSCODE_WORKERS = 2
+TRANSCODE_WAIT_TIME = 30
+TRANSCODE_CHUNK_SIZE = 64 * 1024
+TRANSCODE_CACHE_DIR = "/tmp/youtube_downloader_transcode"
+SECRET_KEY = ""
+AUTH_MODE = "session"
+AUTH_TOKEN_EXPIRY = 7 * 24 * 3600
+VIDEOS_COL = "youtube_downloader_videos"
+SEARCH_INDEX_SIZE = 10000
+SEARCH_RESULT_LIMIT = 20
+ADMIN_EMAILS = []
+PROFILE_ENABLED = False
+PROFILE_SAMPLE_RATE = 0.01
+PROFILE_INTERVAL = 0.005
+PROFILE_HEADER = "X-Profile"
+USAGE_COL = "youtube_downloader_usage"
+USAGE_FLUSH_INTERVAL = 30
+DAILY_LOOKUP_LIMIT = 500
+DAILY_BYTES_LIMIT = 5 * 1024 ** 3
+REVOKED_TOKENS_COL = "youtube_downloader_revoked_tokens"
+REVOCATION_SYNC_INTERVAL = 30
+SEARCH_INDEX_REFRESH_INTERVAL = 60
+ANON_DAILY_LOOKUP_LIMIT = 50
+ANON_DAILY_BYTES_LIMIT = 512 * 1024 ** 2
@@ -11,3 +11,12 @@ NO_USER_ERR_MSG = "No user found with the given id"
 PROFILE_UPDATE_FAILED_ERR_MSG = "Something went wrong while updating the profile, Please try again"
 PROFILE_UPDATE_SUCCESS_MSG = "Profile updated successfully"
 LOGOUT_SUCCESS_MSG = "Logout Successful"
+INVALID_PROFILE_ERR_MSG = "Invalid target profile, Please choose one of the supported profiles"
+FORMAT_NOT_FOUND_ERR_MSG = "No matching format found for the given video"
+FORMAT_TYPE_ERR_MSG = "The given format does not have the stream needed for the target profile"
+INVALID_SEARCH_QUERY_ERR_MSG = "query must be a non empty string"
+TRANSCODE_BUSY_ERR_MSG = "All transcoding workers are busy, Please try again later"
+TRANSCODE_FAILED_ERR_MSG = "Something went wrong while transcoding, Please try again"
+NOT_ADMIN_ERR_MSG = "You are not authorized, Only admins can access this api"
+LOOKUP_QUOTA_EXCEEDED_ERR_MSG = "Daily video lookup limit reached, Please try again tomorrow"
+BYTES_QUOTA_EXCEEDED_ERR_MSG = "Daily download limit reached, Please try again tomorrow"
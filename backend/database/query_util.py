@@ -85,19 +85,20 @@ def run_insert_many_query(collection, documents, error=False,
     return 0 if resp is None else len(resp.inserted_ids)
 
 
-def run_update_one_query(collection, filter_query, update_query, error=False,
+def run_update_one_query(collection, filter_query, update_query, upsert=False, error=False,
                          error_msg=SOMETHING_WENT_WRONG_ERR_MSG):
     """
     Runs update one query on mongo database collection
     :param collection: str
     :param filter_query: dict
     :param update_query: dict
+    :param upsert: bool
     :param error: bool
     :param error_msg: str
     :return: tuple
     """
     logger.debug("entering function run_update_one_query")
-    resp = mongo_client.db[collection].update_one(filter_query, update_query)
+    resp = mongo_client.db[collection].update_one(filter_query, update_query, upsert=upsert)
     if resp is None and error:
         raise CustomException(error_msg)
     logger.debug("exiting function run_update_one_query")
@@ -157,3 +158,17 @@ def run_delete_many_query(collection, query, error=False,
         raise CustomException(error_msg)
     logger.debug("exiting function run_delete_many_query")
     return 0 if resp is None else resp.deleted_count
+
+
+def run_create_index_query(collection, keys, **options):
+    """
+    Creates index on mongo database collection if it does not exist
+    :param collection: str
+    :param keys: list
+    :param options: index options like unique, expireAfterSeconds
+    :return: str
+    """
+    logger.debug("entering function run_create_index_query")
+    index_name = mongo_client.db[collection].create_index(keys, **options)
+    logger.debug("exiting function run_create_index_query")
+    return index_name
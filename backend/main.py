@@ -1,33 +1,110 @@
-from flask import Flask
+import os
+import threading
+from flask import Flask, Response, request, g
 from flask_cors import CORS
+from flask_login import login_required
 from sentry_sdk import init as sentry_init
 import config
 from database import mongo_client
+from database.query_util import run_create_index_query
 from log import get_logger
 from models.error_handler import error_blueprint
-from models.users_handler import users_blueprint
+from models.transcode_handler import transcode_blueprint
+from models.usage_handler import usage_blueprint
+from models.users_handler import users_blueprint, check_admin_user, is_admin_user
 from models.video_handler import video_blueprint
+from util.profile_util import StackSampler, is_request_sampled
 
 logger = get_logger(__name__)
 
 sentry_init(config.SENTRY_DSN, traces_sample_rate=1.0)
 
 app = Flask(__name__)
+app.secret_key = config.SECRET_KEY
 
 CORS(app)
 
 app.register_blueprint(error_blueprint)
+app.register_blueprint(transcode_blueprint)
+app.register_blueprint(usage_blueprint)
 app.register_blueprint(users_blueprint)
 app.register_blueprint(video_blueprint)
 
 mongo_client.init_app(app, uri=config.MONGO_URI)
 
 
+
+def create_indexes():
+    """
+    Create the indexes used by the apis, the server starts even if database is down
+    :return: None
+    """
+    try:
+        run_create_index_query(config.VIDEOS_COL, [("id", 1)], unique=True)
+        run_create_index_query(config.VIDEOS_COL, [("extracted_at", 1)])
+        run_create_index_query(config.USAGE_COL, [("user_id", 1), ("day", 1)], unique=True)
+        if config.AUTH_MODE == "token":
+            run_create_index_query(config.REVOKED_TOKENS_COL, [("expire_at", 1)],
+                                   expireAfterSeconds=0)
+    except Exception:
+        logger.exception("failed to create database indexes")
+
+
+# index creation waits for database, so it does not block the startup
+threading.Thread(target=create_indexes, name="create-indexes", daemon=True).start()
+
+stack_sampler = StackSampler(config.PROFILE_INTERVAL)
+
+
+@app.before_request
+def start_profiling():
+    """
+    Sample the stacks of a fraction of requests, or of any admin request carrying the profile header
+    :return: None
+    """
+    if not config.PROFILE_ENABLED:
+        return
+    if is_request_sampled(config.PROFILE_SAMPLE_RATE, request.headers.get(config.PROFILE_HEADER),
+                          is_admin_user):
+        g.profiled = True
+        stack_sampler.start_request(request.endpoint or "unknown")
+
+
+@app.teardown_request
+def stop_profiling(_error=None):
+    """
+    Stop sampling the stacks of the current request
+    :return: None
+    """
+    if g.get("profiled"):
+        stack_sampler.stop_request()
+
+
 @app.route("/")
 def home():
     return "the server is up & running"
 
 
+@app.route("/admin/profile", methods=["GET"])
+@login_required
+def get_profile_stacks():
+    """
+    Get the sampled stacks in collapsed format, optionally filtered by endpoint
+    and reset after reading. Stacks are kept per process, so only the stacks of
+    the gunicorn worker answering this call are returned, its pid is sent in the
+    X-Profile-Worker header and stacks of all workers are got by calling until
+    every pid is seen
+    :return: text
+    """
+    check_admin_user()
+    collapsed_stacks = stack_sampler.get_collapsed_stacks(request.args.get("endpoint"))
+    if request.args.get("reset"):
+        stack_sampler.reset()
+    response = Response(collapsed_stacks, mimetype="text/plain")
+    response.headers["X-Profile-Worker"] = str(os.getpid())
+    return response
+
+
 if __name__ == "__main__":
     logger.info("starting server in local mode")
     app.run(host=config.HOST, port=config.PORT, debug=config.DEBUG)
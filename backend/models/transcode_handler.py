@@ -0,0 +1,277 @@
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import config
+from flask import Blueprint, Response, request, send_file
+from log import get_logger
+from models.error_handler import CustomException
+from models.video_handler import ydl
+from util.quota_util import usage_counter, check_usage_limit, get_usage_key
+from util.validation_util import validate_fields, ValidationException
+from config.messages import *
+
+logger = get_logger(__name__)
+
+# target profiles, every input is a "video", an "audio" or an mp4 compatible "mp4_audio" source format
+TRANSCODE_PROFILES = {
+    "mp3": {
+        "ext": "mp3",
+        "mimetype": "audio/mpeg",
+        "inputs": ["audio"],
+        "args": ["-vn", "-codec:a", "libmp3lame", "-q:a", "2", "-f", "mp3"]
+    },
+    "mp4": {
+        "ext": "mp4",
+        "mimetype": "video/mp4",
+        "inputs": ["video", "mp4_audio"],
+        "args": ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy",
+                 "-movflags", "frag_keyframe+empty_moov", "-f", "mp4"]
+    }
+}
+
+# bounds the number of ffmpeg processes running at the same time in this worker
+transcode_slots = threading.BoundedSemaphore(config.TRANSCODE_WORKERS)
+
+transcode_blueprint = Blueprint("transcode", __name__)
+
+
+@transcode_blueprint.route("/transcode", methods=["GET"])
+def transcode():
+    """
+    Stream the given video converted to the requested target profile
+    :return: stream
+    """
+    logger.debug("entering function transcode")
+    req_json = request.json
+    validate_fields(req_json, ["url", "profile"])
+    response = get_transcoded_response(req_json["url"], req_json["profile"],
+                                       req_json.get("format_id"))
+    logger.debug("exiting function transcode")
+    return response
+
+
+def get_transcoded_response(url, profile, format_id=None):
+    """
+    Get the transcoded output from cache or start a new transcoding job
+    :param url: str
+    :param profile: str
+    :param format_id: str
+    :return: Response
+    """
+    logger.debug("entering function get_transcoded_response")
+    if profile not in TRANSCODE_PROFILES:
+        raise ValidationException(INVALID_PROFILE_ERR_MSG)
+    profile_details = TRANSCODE_PROFILES[profile]
+    usage_key = get_usage_key()
+    check_usage_limit(usage_key, "bytes_proxied")
+
+    result = ydl.extract_info(url, download=False)
+    source_formats = get_source_formats(result["formats"], profile_details["inputs"], format_id)
+    cache_key = (result["id"], "+".join(f["format_id"] for f in source_formats), profile)
+
+    cache_path = get_cache_path(cache_key, profile_details["ext"])
+    if os.path.exists(cache_path):
+        logger.info("serving transcoded output for %s from cache", cache_key)
+        usage_counter.add(usage_key, "bytes_proxied", os.path.getsize(cache_path))
+        return send_file(cache_path, mimetype=profile_details["mimetype"])
+
+    if not transcode_slots.acquire(timeout=config.TRANSCODE_WAIT_TIME):
+        raise CustomException(TRANSCODE_BUSY_ERR_MSG, 503)
+    try:
+        job = TranscodeJob(cache_key, [f["url"] for f in source_formats], profile_details, usage_key)
+    except Exception:
+        transcode_slots.release()
+        raise
+    if not job.read_first_chunk():
+        job.close()
+        raise CustomException(TRANSCODE_FAILED_ERR_MSG)
+    response = Response(job.stream(), mimetype=profile_details["mimetype"])
+    response.call_on_close(job.close)
+    logger.debug("exiting function get_transcoded_response")
+    return response
+
+
+def get_source_formats(all_formats, inputs, format_id=None):
+    """
+    Pick the source formats for every input of the target profile,
+    the given format id is used for the first input
+    :param all_formats: list
+    :param inputs: list
+    :param format_id: str
+    :return: list
+    """
+    logger.debug("entering function get_source_formats")
+    source_formats = []
+    for index, input_type in enumerate(inputs):
+        if index == 0 and format_id is not None:
+            candidates = [f for f in all_formats if f["format_id"] == format_id]
+            if candidates and not has_stream_type(candidates[0], input_type):
+                raise ValidationException(FORMAT_TYPE_ERR_MSG)
+        else:
+            candidates = [f for f in all_formats if is_format_of_type(f, input_type)]
+        if not candidates:
+            raise CustomException(FORMAT_NOT_FOUND_ERR_MSG, 404)
+        source_formats.append(max(candidates, key=get_format_quality))
+    logger.debug("exiting function get_source_formats")
+    return source_formats
+
+
+def is_format_of_type(format_i, input_type):
+    """
+    check if the given format has only the given type of stream
+    :param format_i: dict
+    :param input_type: str
+    :return: boolean
+    """
+    has_video = format_i.get("vcodec", "none") != "none"
+    has_audio = format_i.get("acodec", "none") != "none"
+    if input_type == "video":
+        return has_video and not has_audio
+    if input_type == "mp4_audio":
+        return has_audio and not has_video and is_mp4_audio(format_i)
+    return has_audio and not has_video
+
+
+def has_stream_type(format_i, input_type):
+    """
+    check if the given format has the type of stream needed for the given input,
+    it may have other streams too
+    :param format_i: dict
+    :param input_type: str
+    :return: boolean
+    """
+    if input_type == "video":
+        return format_i.get("vcodec", "none") != "none"
+    if input_type == "mp4_audio":
+        return format_i.get("acodec", "none") != "none" and is_mp4_audio(format_i)
+    return format_i.get("acodec", "none") != "none"
+
+
+def is_mp4_audio(format_i):
+    """
+    check if the audio of the given format can be copied into mp4 as it is,
+    opus or vorbis in mp4 does not play on many players
+    :param format_i: dict
+    :return: boolean
+    """
+    return format_i.get("ext") == "m4a" or (format_i.get("acodec") or "").startswith("mp4a")
+
+
+def get_format_quality(format_i):
+    """
+    Get sortable quality of the given format
+    :param format_i: dict
+    :return: tuple
+    """
+    return format_i.get("height") or 0, format_i.get("tbr") or format_i.get("abr") or 0
+
+
+def get_cache_path(cache_key, ext):
+    """
+    Get the file path of the transcoded output for the given cache key
+    :param cache_key: tuple
+    :param ext: str
+    :return: str
+    """
+    file_name = re.sub(r"[^\w.+-]", "_", "_".join(cache_key))
+    return os.path.join(config.TRANSCODE_CACHE_DIR, f"{file_name}.{ext}")
+
+
+class TranscodeJob:
+    """
+    Runs one ffmpeg process and streams its output while writing it to the cache
+    """
+
+    def __init__(self, cache_key, input_urls, profile_details, usage_key=None):
+        """
+        :param cache_key: tuple
+        (video id, format id, target profile)
+        :param input_urls: list
+        source urls in the order expected by the profile
+        :param profile_details: dict
+        one of TRANSCODE_PROFILES
+        :param usage_key: str
+        user id or client ip to account the streamed bytes to
+        """
+        self.cache_key = cache_key
+        self.usage_key = usage_key
+        self.cache_path = get_cache_path(cache_key, profile_details["ext"])
+        self.temp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.part"
+        self.closed = False
+        self.first_chunk = b""
+        command = [config.FFMPEG_PATH, "-hide_banner", "-loglevel", "error"]
+        for input_url in input_urls:
+            command += ["-i", input_url]
+        command += profile_details["args"] + ["pipe:1"]
+        logger.info("starting transcoding job for %s", cache_key)
+        # stderr goes to a file, an unread pipe can fill up and block ffmpeg
+        self.error_file = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=self.error_file)
+
+    def read_first_chunk(self):
+        """
+        Read the first chunk of output before the response is started,
+        so that a job failing without any output can be reported as an error
+        :return: boolean
+        """
+        self.first_chunk = self.process.stdout.read(config.TRANSCODE_CHUNK_SIZE)
+        if not self.first_chunk and self.process.wait() != 0:
+            self.log_error()
+            return False
+        return True
+
+    def stream(self):
+        """
+        Yield the ffmpeg output chunk by chunk, starting with the first chunk
+        if it is already read, the output is cached only when the process
+        finishes successfully
+        :return: generator
+        """
+        os.makedirs(config.TRANSCODE_CACHE_DIR, exist_ok=True)
+        chunk, self.first_chunk = self.first_chunk, b""
+        with open(self.temp_path, "wb") as temp_file:
+            while True:
+                if not chunk:
+                    chunk = self.process.stdout.read(config.TRANSCODE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                temp_file.write(chunk)
+                if self.usage_key is not None:
+                    usage_counter.add(self.usage_key, "bytes_proxied", len(chunk))
+                yield chunk
+                chunk = b""
+        if self.process.wait() != 0:
+            self.log_error()
+            return
+        os.replace(self.temp_path, self.cache_path)
+        logger.info("transcoded output cached for %s", self.cache_key)
+
+    def log_error(self):
+        """
+        Log the error output of the failed process
+        :return: None
+        """
+        self.error_file.seek(0)
+        logger.error("transcoding failed for %s, error = %s", self.cache_key,
+                     self.error_file.read().decode(errors="replace"))
+
+    def close(self):
+        """
+        Stop the process if it is still running and free the worker slot
+        :return: None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.process.poll() is None:
+            logger.info("killing unfinished transcoding job for %s", self.cache_key)
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+        self.error_file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        transcode_slots.release()
@@ -0,0 +1,47 @@
+import config
+from flask import Blueprint, jsonify, request
+from flask_login import current_user, login_required
+from database.query_util import run_find_many_query
+from log import get_logger
+from models.users_handler import check_admin_user
+from util.quota_util import usage_counter, get_usage_day, get_usage_limits
+from util.resp_util import get_success_response
+
+logger = get_logger(__name__)
+
+usage_blueprint = Blueprint("usage", __name__)
+
+
+@usage_blueprint.route("/get_usage", methods=["GET"])
+@login_required
+def get_usage():
+    """
+    Get today's usage and limits of the current user
+    :return: json
+    """
+    logger.debug("entering function get_usage")
+    usage = usage_counter.get_usage(current_user.id, refresh=True)
+    response = {
+        "day": get_usage_day(),
+        "usage": usage,
+        "limits": get_usage_limits(current_user.id)
+    }
+    logger.debug("exiting function get_usage")
+    return jsonify(get_success_response(data=response))
+
+
+@usage_blueprint.route("/admin/usage", methods=["GET"])
+@login_required
+def get_usage_report():
+    """
+    Get flushed usage of all users for the given day, ordered by bytes proxied
+    :return: json
+    """
+    logger.debug("entering function get_usage_report")
+    check_admin_user()
+    day = request.args.get("day", get_usage_day())
+    limit = request.args.get("limit", 100, type=int)
+    cursor = run_find_many_query(config.USAGE_COL, {"day": day}, {"_id": 0}, limit=limit)
+    response = list(cursor.sort("bytes_proxied", -1))
+    logger.debug("exiting function get_usage_report")
+    return jsonify(get_success_response(data=response))
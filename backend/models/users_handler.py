@@ -1,12 +1,16 @@
+import os
+import threading
 import time
 import config
+from datetime import datetime
 from uuid import uuid4
 from flask import Blueprint, jsonify, request
 from flask_login import UserMixin, login_user, current_user
 from flask_login import logout_user, login_required, LoginManager
+from itsdangerous import URLSafeSerializer, BadSignature
 from werkzeug.security import generate_password_hash, check_password_hash
 from database.query_util import *
-from util.cache import local_user_cache
+from util.cache import local_user_cache, revoked_auth_tokens
 from util.resp_util import *
 from util.validation_util import *
 from config.messages import *
@@ -48,6 +52,11 @@ def on_load(state):
 
 login_manager.login_view = "user_handler.login_to_access"
 
+revocation_sync_lock = threading.Lock()
+
+if config.AUTH_MODE == "token" and not config.SECRET_KEY:
+    raise RuntimeError("SECRET_KEY must be set to use the token auth mode")
+
 
 @users_blueprint.route("/login_to_access")
 def login_to_access():
@@ -86,6 +95,155 @@ def load_user_object(user_id):
     return result
 
 
+@login_manager.request_loader
+def load_user_from_request(req):
+    """
+    Load user object from the bearer token of the request
+    :param req: flask request
+    :return: User Object || None
+    """
+    if config.AUTH_MODE != "token":
+        return None
+    token = get_bearer_token(req)
+    payload = None if token is None else read_auth_token(token)
+    if payload is None:
+        return None
+    return User(payload["uid"], payload["email"])
+
+
+def get_bearer_token(req):
+    """
+    Get the bearer token from the authorization header of the request
+    :param req: flask request
+    :return: str || None
+    """
+    auth_header = req.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    return auth_header[len("Bearer "):]
+
+
+def get_token_serializer():
+    """
+    Get the auth token serializer, tokens signed with an empty key could be forged
+    :return: URLSafeSerializer
+    """
+    if not config.SECRET_KEY:
+        raise RuntimeError("SECRET_KEY must be set to sign auth tokens")
+    return URLSafeSerializer(config.SECRET_KEY, salt="auth-token")
+
+
+def generate_auth_token(user_id, email):
+    """
+    Generate signed auth token carrying the user details and expiry
+    :param user_id: str
+    :param email: str
+    :return: str
+    """
+    payload = {
+        "uid": user_id,
+        "email": email,
+        "jti": uuid4().hex[:16],
+        "exp": int(time.time()) + config.AUTH_TOKEN_EXPIRY
+    }
+    return get_token_serializer().dumps(payload)
+
+
+def read_auth_token(token):
+    """
+    Verify the given auth token without any database or cache lookup,
+    only the in memory copy of the revocation list kept by the sync thread is checked
+    :param token: str
+    :return: dict || None
+    """
+    try:
+        payload = get_token_serializer().loads(token)
+    except BadSignature:
+        logger.error("auth token with bad signature")
+        return None
+    if payload["exp"] < time.time():
+        logger.info("auth token expired for user id %s", payload["uid"])
+        return None
+    ensure_revocation_sync_running()
+    if payload["jti"] in revoked_auth_tokens["tokens"]:
+        logger.info("auth token revoked for user id %s", payload["uid"])
+        return None
+    return payload
+
+
+def revoke_auth_token(token):
+    """
+    Add the given auth token to the shared revocation list until it expires,
+    database removes it after expiry through the TTL index on expire_at
+    :param token: str
+    :return: None
+    """
+    payload = read_auth_token(token)
+    if payload is None:
+        return
+    doc = {"jti": payload["jti"], "expire_at": datetime.utcfromtimestamp(payload["exp"])}
+    run_insert_one_query(config.REVOKED_TOKENS_COL, doc, error=True)
+    revoked_auth_tokens["tokens"][payload["jti"]] = payload["exp"]
+    logger.info("auth token revoked for user id %s", payload["uid"])
+
+
+def ensure_revocation_sync_running():
+    """
+    Start the revocation sync thread once per process, threads do not survive a fork
+    :return: None
+    """
+    if revoked_auth_tokens["pid"] == os.getpid():
+        return
+    with revocation_sync_lock:
+        if revoked_auth_tokens["pid"] == os.getpid():
+            return
+        revoked_auth_tokens["pid"] = os.getpid()
+        threading.Thread(target=run_revocation_sync, name="revocation-sync", daemon=True).start()
+        logger.info("started revocation sync thread")
+
+
+def run_revocation_sync():
+    """
+    Revocation sync loop, a token revoked on another worker stops working
+    here within REVOCATION_SYNC_INTERVAL seconds plus the time of one sync
+    :return: None
+    """
+    while True:
+        sync_revoked_auth_tokens()
+        time.sleep(config.REVOCATION_SYNC_INTERVAL)
+
+
+def sync_revoked_auth_tokens():
+    """
+    Reload the revocation list from database, if database is down the old list is kept
+    :return: None
+    """
+    find_query = {"expire_at": {"$gt": datetime.utcnow()}}
+    project_query = {"_id": 0, "jti": 1, "expire_at": 1}
+    try:
+        cursor = run_find_many_query(config.REVOKED_TOKENS_COL, find_query, project_query, limit=0)
+        revoked_auth_tokens["tokens"] = {doc["jti"]: doc["expire_at"] for doc in cursor}
+    except Exception:
+        logger.exception("failed to sync revoked auth tokens")
+
+
+def is_admin_user():
+    """
+    check if the current user is a logged in admin
+    :return: boolean
+    """
+    return current_user.is_authenticated and current_user.email in config.ADMIN_EMAILS
+
+
+def check_admin_user():
+    """
+    Raise error if the current logged in user is not an admin
+    :return: None || Exception
+    """
+    if not is_admin_user():
+        raise CustomException(NOT_ADMIN_ERR_MSG, 403)
+
+
 @users_blueprint.route("/register", methods=["POST"])
 def register_post():
     """
@@ -175,9 +333,15 @@ def check_user_credentials(req_data):
     if not check_password_hash(result["password"], req_data["password"]):
         raise CustomException(WRONG_CREDENTIALS_ERR_MSG, 401)
 
+    if config.AUTH_MODE == "token":
+        token = generate_auth_token(result["user_id"], req_data["email"])
+        logger.info("user login successful for %s", result["user_id"])
+        logger.debug("exiting function check_user_credentials")
+        return get_success_response(LOGIN_SUCCESS_MSG, data={"token": token})
+
     is_remember = True if "remember" in req_data and req_data["remember"] else False
     login_user(User(result["user_id"], req_data["email"]), remember=is_remember)
-    logger.info("user login successful for %s", req_data["user_id"])
+    logger.info("user login successful for %s", result["user_id"])
 
     logger.debug("exiting function check_user_credentials")
     return get_success_response(LOGIN_SUCCESS_MSG)
@@ -257,6 +421,9 @@ def logout():
     :return: json
     """
     logger.debug("entering function logout")
+    token = get_bearer_token(request)
+    if token is not None:
+        revoke_auth_token(token)
     logout_user()
     logger.debug("exiting function logout")
     return jsonify(get_success_response(LOGOUT_SUCCESS_MSG))
@@ -1,8 +1,15 @@
+import time
+import config
 from flask import Blueprint, request, jsonify
 from log import get_logger
 from youtube_dl import YoutubeDL
 
+from database.query_util import run_find_many_query, run_update_one_query
+from util.quota_util import usage_counter, check_usage_limit, get_usage_key
 from util.resp_util import get_success_response
+from util.search_util import video_search_index
+from util.validation_util import validate_fields, ValidationException
+from config.messages import INVALID_SEARCH_QUERY_ERR_MSG
 
 logger = get_logger(__name__)
 
@@ -19,7 +26,10 @@ def get_video_details():
     """
     req_json = request.json
     url = req_json['url']
+    usage_key = get_usage_key()
+    check_usage_limit(usage_key, "lookups")
     response = get_youtube_video_details(url)
+    usage_counter.add(usage_key, "lookups")
     return jsonify(get_success_response(data=response))
 
 
@@ -40,10 +50,82 @@ def get_youtube_video_details(url):
         "height": result["height"],
         "formats": get_youtube_valid_formats(result["formats"])
     }
+    save_video_details(all_details)
     logger.debug("exiting function get_youtube_video_details")
     return all_details
 
 
+def save_video_details(all_details):
+    """
+    Persist the extracted video details and add them to the search index
+    :param all_details: dict
+    :return: None
+    """
+    logger.debug("entering function save_video_details")
+    video_doc = dict(all_details, extracted_at=int(time.time()))
+    try:
+        run_update_one_query(config.VIDEOS_COL, {"id": video_doc["id"]}, {"$set": video_doc},
+                             upsert=True)
+    except Exception:
+        # the extracted details are still returned when they can not be persisted
+        logger.exception("failed to save video details for %s", video_doc["id"])
+    video_search_index.add_video(video_doc)
+    logger.debug("exiting function save_video_details")
+
+
+@video_blueprint.route("/search_videos", methods=["GET"])
+def search_videos():
+    """
+    Search previously extracted videos by title and description
+    :return: json
+    """
+    req_json = request.json
+    validate_fields(req_json, ["query"])
+    if not isinstance(req_json["query"], str) or not req_json["query"].strip():
+        raise ValidationException(INVALID_SEARCH_QUERY_ERR_MSG)
+    response = search_video_details(req_json["query"])
+    return jsonify(get_success_response(data=response))
+
+
+def search_video_details(query):
+    """
+    Search the local index of extracted videos, the index is refreshed
+    from database at most once every SEARCH_INDEX_REFRESH_INTERVAL seconds
+    :param query: str
+    :return: list
+    """
+    logger.debug("entering function search_video_details")
+    if time.time() - video_search_index.prev_time >= config.SEARCH_INDEX_REFRESH_INTERVAL:
+        refresh_video_search_index()
+    result = video_search_index.search(query, config.SEARCH_RESULT_LIMIT)
+    logger.debug("exiting function search_video_details")
+    return result
+
+
+def refresh_video_search_index():
+    """
+    Load the videos extracted by any worker since the last refresh into the
+    search index, newest videos first when there are more than the index size
+    :return: None
+    """
+    logger.debug("entering function refresh_video_search_index")
+    video_search_index.prev_time = time.time()
+    find_query = {"extracted_at": {"$gte": video_search_index.last_extracted_at}}
+    try:
+        cursor = run_find_many_query(config.VIDEOS_COL, find_query, {"_id": 0},
+                                     limit=config.SEARCH_INDEX_SIZE)
+        video_docs = list(cursor.sort("extracted_at", -1))
+    except Exception:
+        logger.exception("failed to refresh search index")
+        return
+    for video_doc in reversed(video_docs):
+        video_search_index.add_video(video_doc)
+    if video_docs:
+        video_search_index.last_extracted_at = video_docs[0]["extracted_at"]
+    logger.info("loaded %s videos into search index", len(video_docs))
+    logger.debug("exiting function refresh_video_search_index")
+
+
 def get_youtube_valid_formats(all_formats):
     """
     Get Youtube valid formats from list of all formats
@@ -75,6 +157,7 @@ def get_limited_details(format_i):
     :return: dict
     """
     return {
+        "format_id": format_i["format_id"],
         "format": format_i["format_note"],
         "ext": format_i["ext"],
         "width": format_i["width"],
@@ -0,0 +1,76 @@
+import sys
+import threading
+import time
+from util.profile_util import StackSampler, get_collapsed_stack, is_request_sampled
+
+
+def busy_request(sampler, endpoint, seconds):
+    sampler.start_request(endpoint)
+    try:
+        start = time.time()
+        while time.time() - start < seconds:
+            pass
+    finally:
+        sampler.stop_request()
+
+
+def run_request(sampler, endpoint, seconds=0.1):
+    thread = threading.Thread(target=busy_request, args=(sampler, endpoint, seconds))
+    thread.start()
+    thread.join()
+
+
+def parse_collapsed_stacks(collapsed_stacks):
+    samples = dict()
+    for line in collapsed_stacks.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        samples[stack] = int(count)
+    return samples
+
+
+def test_samples_are_aggregated_per_endpoint():
+    sampler = StackSampler(0.001)
+    run_request(sampler, "video.get_video_details")
+    run_request(sampler, "video.search_videos")
+    samples = parse_collapsed_stacks(sampler.get_collapsed_stacks("video.get_video_details"))
+    assert samples
+    for stack, count in samples.items():
+        assert stack.startswith("video.get_video_details;")
+        assert stack.endswith(";test_profile_util.py:busy_request")
+        assert count > 0
+    assert "video.search_videos" in sampler.get_collapsed_stacks()
+
+
+def test_unregistered_threads_are_not_sampled():
+    sampler = StackSampler(0.001)
+    run_request(sampler, "video.get_video_details", 0.02)
+    samples_after_request = sampler.get_collapsed_stacks()
+    time.sleep(0.02)
+    assert sampler.active_threads == dict()
+    assert sampler.get_collapsed_stacks() == samples_after_request
+
+
+def test_reset_clears_samples():
+    sampler = StackSampler(0.001)
+    run_request(sampler, "video.get_video_details", 0.02)
+    sampler.reset()
+    assert sampler.get_collapsed_stacks() == ""
+
+
+def test_collapsed_stack_is_root_first():
+    stack = get_collapsed_stack(sys._getframe())
+    assert stack.endswith(";test_profile_util.py:test_collapsed_stack_is_root_first")
+    assert stack.count(";") > 0
+
+
+def test_profile_header_is_honored_only_for_admins():
+    assert is_request_sampled(0, "1", lambda: True)
+    assert not is_request_sampled(0, "1", lambda: False)
+
+
+def test_admin_check_is_skipped_without_profile_header():
+    def fail_admin_check():
+        raise AssertionError("admin check must not run without the header")
+
+    assert not is_request_sampled(0, None, fail_admin_check)
+    assert is_request_sampled(1, None, fail_admin_check)
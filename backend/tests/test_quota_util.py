@@ -0,0 +1,84 @@
+import pytest
+from util import quota_util
+from util.quota_util import UsageCounter, get_usage_day
+
+
+class FakeUsageCollection:
+    """
+    Stands in for the usage collection, reads can be made to fail
+    """
+
+    def __init__(self):
+        self.docs = dict()
+        self.fail_reads = False
+
+    def update(self, collection, filter_query, update_query, **kwargs):
+        doc = self.docs.setdefault((filter_query["user_id"], filter_query["day"]), dict())
+        for field, count in update_query["$inc"].items():
+            doc[field] = doc.get(field, 0) + count
+
+    def find(self, collection, query, projection=None, **kwargs):
+        if self.fail_reads:
+            raise ConnectionError("database is down")
+        return self.docs.get((query["user_id"], query["day"]))
+
+
+@pytest.fixture
+def usage_db(monkeypatch):
+    fake_db = FakeUsageCollection()
+    monkeypatch.setattr(quota_util, "run_update_one_query", fake_db.update)
+    monkeypatch.setattr(quota_util, "run_find_one_query", fake_db.find)
+    # no flush thread or exit hook, tests flush by hand
+    monkeypatch.setattr(UsageCounter, "ensure_running", lambda self: None)
+    return fake_db
+
+
+def test_flush_writes_every_user_when_totals_can_not_be_read(usage_db):
+    counter = UsageCounter(30)
+    for user_id in ["a", "b", "c"]:
+        counter.add(user_id, "lookups", 2)
+    usage_db.fail_reads = True
+    counter.flush()
+    assert counter.pending == {}
+    assert {key[0]: doc["lookups"] for key, doc in usage_db.docs.items()} == \
+        {"a": 2, "b": 2, "c": 2}
+
+
+def test_get_usage_uses_last_totals_when_totals_can_not_be_read(usage_db):
+    counter = UsageCounter(30)
+    usage_db.docs[("a", get_usage_day())] = {"lookups": 5}
+    assert counter.get_usage("a")["lookups"] == 5
+    counter.totals[("a", get_usage_day())]["prev_time"] -= 31
+    usage_db.fail_reads = True
+    counter.add("a", "lookups", 2)
+    assert counter.get_usage("a")["lookups"] == 7
+    assert counter.get_usage("b")["lookups"] == 0
+
+
+def test_flush_keeps_counters_which_fail_to_write(usage_db, monkeypatch):
+    counter = UsageCounter(30)
+    counter.add("a", "lookups", 3)
+
+    def fail_update(*args, **kwargs):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(quota_util, "run_update_one_query", fail_update)
+    with pytest.raises(ConnectionError):
+        counter.flush()
+    assert counter.get_usage("a")["lookups"] == 3
+
+
+def test_get_usage_reads_totals_again_after_flush_interval(usage_db):
+    counter = UsageCounter(30)
+    assert counter.get_usage("a")["lookups"] == 0
+    # another worker flushes usage of the same user
+    usage_db.docs[("a", get_usage_day())] = {"lookups": 10000}
+    assert counter.get_usage("a")["lookups"] == 0
+    counter.totals[("a", get_usage_day())]["prev_time"] -= 31
+    assert counter.get_usage("a")["lookups"] == 10000
+
+
+def test_anonymous_clients_get_their_own_limits():
+    limits = quota_util.get_usage_limits("ip:127.0.0.1")
+    assert limits["lookups"] == quota_util.config.ANON_DAILY_LOOKUP_LIMIT
+    assert quota_util.get_usage_limits("user-1")["lookups"] == quota_util.config.DAILY_LOOKUP_LIMIT
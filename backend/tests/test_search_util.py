@@ -0,0 +1,28 @@
+from util.search_util import VideoSearchIndex
+
+
+def get_ids(videos):
+    return [video["id"] for video in videos]
+
+
+def test_search_ranks_by_matched_words():
+    index = VideoSearchIndex(10)
+    index.add_video({"id": "a", "title": "Python tutorial", "description": "basics"})
+    index.add_video({"id": "b", "title": "Python flask tutorial", "description": None})
+    assert get_ids(index.search("flask python", 10)) == ["b", "a"]
+
+
+def test_add_video_replaces_old_words():
+    index = VideoSearchIndex(10)
+    index.add_video({"id": "a", "title": "old title", "description": ""})
+    index.add_video({"id": "a", "title": "new title", "description": ""})
+    assert index.search("old", 10) == []
+    assert get_ids(index.search("new", 10)) == ["a"]
+
+
+def test_add_video_drops_least_recently_added_over_max_size():
+    index = VideoSearchIndex(2)
+    for video_id in ["a", "b", "c"]:
+        index.add_video({"id": video_id, "title": "music", "description": ""})
+    assert sorted(get_ids(index.search("music", 10))) == ["b", "c"]
+    assert "a" not in index.videos
@@ -0,0 +1,139 @@
+import os
+import shutil
+import stat
+import wave
+import pytest
+import config
+from models.error_handler import CustomException
+from util.validation_util import ValidationException
+from models import transcode_handler
+from models.transcode_handler import TRANSCODE_PROFILES, TranscodeJob
+from models.transcode_handler import get_source_formats, get_cache_path
+
+ALL_FORMATS = [
+    {"format_id": "140", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none", "abr": 128},
+    {"format_id": "251", "ext": "webm", "acodec": "opus", "vcodec": "none", "abr": 160},
+    {"format_id": "137", "acodec": "none", "vcodec": "avc1", "height": 1080, "tbr": 4000},
+    {"format_id": "136", "acodec": "none", "vcodec": "avc1", "height": 720, "tbr": 2000},
+    {"format_id": "18", "acodec": "mp4a.40.2", "vcodec": "avc1", "height": 360, "tbr": 500}
+]
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which(config.FFMPEG_PATH) is None,
+                                     reason="ffmpeg is not installed")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TRANSCODE_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def wav_file(tmp_path):
+    """
+    Half a second of silent mono audio
+    """
+    path = tmp_path / "input.wav"
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\x00\x00" * 4000)
+    return path
+
+
+def run_job(cache_key, input_urls, profile):
+    transcode_handler.transcode_slots.acquire()
+    job = TranscodeJob(cache_key, input_urls, TRANSCODE_PROFILES[profile])
+    try:
+        output = b"".join(job.stream())
+    finally:
+        job.close()
+    return job, output
+
+
+def make_fake_ffmpeg(tmp_path, monkeypatch, script):
+    fake_ffmpeg = tmp_path / "ffmpeg"
+    fake_ffmpeg.write_text("#!/bin/sh\n" + script)
+    fake_ffmpeg.chmod(fake_ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(config, "FFMPEG_PATH", str(fake_ffmpeg))
+
+
+def test_get_source_formats_picks_best_audio_for_mp3():
+    formats = get_source_formats(ALL_FORMATS, TRANSCODE_PROFILES["mp3"]["inputs"])
+    assert [f["format_id"] for f in formats] == ["251"]
+
+
+def test_get_source_formats_picks_video_and_mp4_audio_for_mp4():
+    formats = get_source_formats(ALL_FORMATS, TRANSCODE_PROFILES["mp4"]["inputs"])
+    assert [f["format_id"] for f in formats] == ["137", "140"]
+
+
+def test_get_source_formats_uses_given_format_id():
+    formats = get_source_formats(ALL_FORMATS, TRANSCODE_PROFILES["mp4"]["inputs"], "136")
+    assert [f["format_id"] for f in formats] == ["136", "140"]
+
+
+def test_get_source_formats_rejects_format_id_without_needed_stream():
+    with pytest.raises(ValidationException):
+        get_source_formats(ALL_FORMATS, TRANSCODE_PROFILES["mp4"]["inputs"], "251")
+
+
+def test_get_source_formats_raises_when_no_format_matches():
+    with pytest.raises(CustomException) as error:
+        get_source_formats(ALL_FORMATS, TRANSCODE_PROFILES["mp3"]["inputs"], "999")
+    assert error.value.status_code == 404
+
+
+def test_get_cache_path_is_safe_file_name(cache_dir):
+    path = get_cache_path(("a/b c", "137+251", "mp4"), "mp4")
+    assert path == os.path.join(str(cache_dir), "a_b_c_137+251_mp4.mp4")
+
+
+@requires_ffmpeg
+def test_transcode_job_streams_and_caches_output(cache_dir, wav_file):
+    cache_key = ("video", "251", "mp3")
+    job, output = run_job(cache_key, [str(wav_file)], "mp3")
+    assert output
+    assert job.process.returncode == 0
+    with open(get_cache_path(cache_key, "mp3"), "rb") as cached:
+        assert cached.read() == output
+    assert os.listdir(str(cache_dir)) == ["video_251_mp3.mp3"]
+
+
+@requires_ffmpeg
+def test_transcode_job_does_not_cache_failed_output(cache_dir, tmp_path):
+    bad_input = tmp_path / "input.wav"
+    bad_input.write_bytes(b"not a media file")
+    job, _output = run_job(("video", "251", "mp3"), [str(bad_input)], "mp3")
+    assert job.process.returncode != 0
+    assert os.listdir(str(cache_dir)) == []
+
+
+def test_transcode_job_with_noisy_stderr_does_not_block(cache_dir, tmp_path, monkeypatch):
+    make_fake_ffmpeg(tmp_path, monkeypatch, "head -c 1000000 /dev/zero >&2\nprintf output\n")
+    cache_key = ("video", "251", "mp3")
+    _job, output = run_job(cache_key, ["input"], "mp3")
+    assert output == b"output"
+    assert os.path.exists(get_cache_path(cache_key, "mp3"))
+
+
+def test_read_first_chunk_reports_job_failing_without_output(cache_dir, tmp_path, monkeypatch):
+    make_fake_ffmpeg(tmp_path, monkeypatch, "echo 'invalid input' >&2\nexit 1\n")
+    transcode_handler.transcode_slots.acquire()
+    job = TranscodeJob(("video", "251", "mp3"), ["input"], TRANSCODE_PROFILES["mp3"])
+    try:
+        assert not job.read_first_chunk()
+    finally:
+        job.close()
+
+
+def test_stream_starts_with_first_chunk(cache_dir, tmp_path, monkeypatch):
+    make_fake_ffmpeg(tmp_path, monkeypatch, "printf output\n")
+    transcode_handler.transcode_slots.acquire()
+    job = TranscodeJob(("video", "251", "mp3"), ["input"], TRANSCODE_PROFILES["mp3"])
+    try:
+        assert job.read_first_chunk()
+        assert b"".join(job.stream()) == b"output"
+    finally:
+        job.close()
@@ -0,0 +1,63 @@
+import pytest
+import config
+from itsdangerous import URLSafeSerializer
+from models import users_handler
+from models.users_handler import generate_auth_token, read_auth_token, revoke_auth_token
+
+
+@pytest.fixture
+def revocation_db(monkeypatch):
+    """
+    Shared revocation collection, the local copy starts out of sync
+    """
+    revoked_docs = []
+    monkeypatch.setattr(config, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(users_handler, "run_find_many_query",
+                        lambda *args, **kwargs: list(revoked_docs))
+    monkeypatch.setattr(users_handler, "run_insert_one_query",
+                        lambda collection, doc, **kwargs: revoked_docs.append(doc))
+    # no sync thread, tests sync by hand
+    monkeypatch.setattr(users_handler, "ensure_revocation_sync_running", lambda: None)
+    monkeypatch.setitem(users_handler.revoked_auth_tokens, "tokens", dict())
+    return revoked_docs
+
+
+def test_read_auth_token_returns_user_details(revocation_db):
+    payload = read_auth_token(generate_auth_token("user-1", "user@example.com"))
+    assert (payload["uid"], payload["email"]) == ("user-1", "user@example.com")
+
+
+def test_read_auth_token_rejects_forged_token(revocation_db):
+    forged = URLSafeSerializer("", salt="auth-token").dumps(
+        {"uid": "user-1", "email": "user@example.com", "jti": "x", "exp": 2 ** 40})
+    assert read_auth_token(forged) is None
+
+
+def test_tokens_are_refused_without_secret_key(monkeypatch):
+    monkeypatch.setattr(config, "SECRET_KEY", "")
+    with pytest.raises(RuntimeError):
+        generate_auth_token("user-1", "user@example.com")
+
+
+def test_revoked_token_is_refused_after_sync(revocation_db):
+    token = generate_auth_token("user-1", "user@example.com")
+    assert read_auth_token(token) is not None
+    revoke_auth_token(token)
+    assert len(revocation_db) == 1
+
+    # another worker only sees the revocation after its next sync
+    users_handler.revoked_auth_tokens["tokens"] = dict()
+    assert read_auth_token(token) is not None
+    users_handler.sync_revoked_auth_tokens()
+    assert read_auth_token(token) is None
+
+
+def test_failed_sync_keeps_old_revocation_list(revocation_db, monkeypatch):
+    users_handler.revoked_auth_tokens["tokens"] = {"revoked": 0}
+
+    def fail_find(*args, **kwargs):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(users_handler, "run_find_many_query", fail_find)
+    users_handler.sync_revoked_auth_tokens()
+    assert users_handler.revoked_auth_tokens["tokens"] == {"revoked": 0}
@@ -0,0 +1,19 @@
+import pytest
+from flask import Flask
+from models.error_handler import error_blueprint
+from models.video_handler import video_blueprint
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(error_blueprint)
+    app.register_blueprint(video_blueprint)
+    return app.test_client()
+
+
+@pytest.mark.parametrize("query", [5, None, ["music"], "", "   "])
+def test_search_videos_rejects_invalid_query(client, query):
+    response = client.get("/search_videos", json={"query": query})
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
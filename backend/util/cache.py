@@ -1 +1,2 @@
 local_user_cache = dict()
+revoked_auth_tokens = {"pid": None, "tokens": dict()}
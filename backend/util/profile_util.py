@@ -0,0 +1,136 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class StackSampler:
+    """
+    Statistical profiler which periodically samples the stacks of the
+    registered request threads and aggregates them per endpoint
+    """
+
+    def __init__(self, interval):
+        """
+        :param interval: float
+        seconds between two samples
+        """
+        self.interval = interval
+        self.active_threads = dict()
+        self.stacks = dict()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start_request(self, endpoint):
+        """
+        Start sampling the current thread for the given endpoint
+        :param endpoint: str
+        :return: None
+        """
+        self.ensure_running()
+        with self.lock:
+            self.active_threads[threading.get_ident()] = endpoint
+
+    def stop_request(self):
+        """
+        Stop sampling the current thread
+        :return: None
+        """
+        with self.lock:
+            self.active_threads.pop(threading.get_ident(), None)
+
+    def ensure_running(self):
+        """
+        Start the sampler thread once per process, threads do not survive a fork
+        :return: None
+        """
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.active_threads = dict()
+            self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+            self.thread.start()
+            logger.info("started stack sampler thread")
+
+    def run(self):
+        """
+        Sampler loop
+        :return: None
+        """
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                active_threads = list(self.active_threads.items())
+            if not active_threads:
+                continue
+            # walk the frames without the lock, request threads take it to register
+            frames = sys._current_frames()
+            samples = []
+            for thread_id, endpoint in active_threads:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples.append((endpoint, get_collapsed_stack(frame)))
+            del frames
+            with self.lock:
+                for endpoint, stack in samples:
+                    self.stacks.setdefault(endpoint, Counter())[stack] += 1
+
+    def get_collapsed_stacks(self, endpoint=None):
+        """
+        Get the sampled stacks in collapsed format, one "stack count" per line,
+        which can be fed to flamegraph tools
+        :param endpoint: str
+        :return: str
+        """
+        lines = []
+        with self.lock:
+            for endpoint_i, counter in self.stacks.items():
+                if endpoint is not None and endpoint_i != endpoint:
+                    continue
+                for stack, count in counter.items():
+                    lines.append(f"{endpoint_i};{stack} {count}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """
+        Clear all the sampled stacks
+        :return: None
+        """
+        with self.lock:
+            self.stacks = dict()
+
+
+def is_request_sampled(sample_rate, header_value, is_admin):
+    """
+    check if the request should be profiled, a fraction of requests are sampled
+    and the profile header is honored only for admins
+    :param sample_rate: float
+    :param header_value: str || None
+    :param is_admin: function
+    called only when the header is present, it may load the user
+    :return: boolean
+    """
+    return random.random() < sample_rate or bool(header_value and is_admin())
+
+
+def get_collapsed_stack(frame):
+    """
+    Get root first, semicolon separated stack of the given frame
+    :param frame: frame
+    :return: str
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
@@ -0,0 +1,235 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+import config
+from flask import request
+from flask_login import current_user
+from database.query_util import run_find_one_query, run_update_one_query
+from log import get_logger
+from models.error_handler import CustomException
+from config.messages import LOOKUP_QUOTA_EXCEEDED_ERR_MSG, BYTES_QUOTA_EXCEEDED_ERR_MSG
+
+logger = get_logger(__name__)
+
+USAGE_FIELDS = ("lookups", "bytes_proxied")
+
+USAGE_LIMIT_ERR_MSGS = {
+    "lookups": LOOKUP_QUOTA_EXCEEDED_ERR_MSG,
+    "bytes_proxied": BYTES_QUOTA_EXCEEDED_ERR_MSG
+}
+
+# anonymous clients are metered by ip address with their own limits
+ANON_USAGE_KEY_PREFIX = "ip:"
+
+
+class UsageCounter:
+    """
+    Per worker usage counters which are flushed to database in batches,
+    quota checks use the flushed totals plus the local unflushed usage,
+    totals are read again from database once they are older than flush_interval
+    """
+
+    def __init__(self, flush_interval):
+        """
+        :param flush_interval: int
+        seconds between two flushes
+        """
+        self.flush_interval = flush_interval
+        self.pending = dict()
+        self.totals = dict()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def add(self, user_id, field, count=1):
+        """
+        Add usage for the given user to the local counters
+        :param user_id: str
+        :param field: str
+        :param count: int
+        :return: None
+        """
+        self.ensure_running()
+        key = (user_id, get_usage_day())
+        with self.lock:
+            counters = self.pending.setdefault(key, dict.fromkeys(USAGE_FIELDS, 0))
+            counters[field] += count
+
+    def get_usage(self, user_id, refresh=False):
+        """
+        Get approximate usage of the given user for today across all workers,
+        usage of other workers is missed for at most two flush intervals,
+        one until they flush and one until the local totals expire, when
+        database can not be read the last known totals are used
+        :param user_id: str
+        :param refresh: bool
+        read the flushed totals from database instead of the local copy
+        :return: dict
+        """
+        key = (user_id, get_usage_day())
+        with self.lock:
+            cached = self.totals.get(key)
+        if refresh or cached is None or time.time() - cached["prev_time"] >= self.flush_interval:
+            try:
+                usage = read_usage(*key)
+            except Exception:
+                # quota is approximate, keep serving with the last known totals
+                # and try database again after one flush interval
+                logger.exception("failed to read usage totals for %s", user_id)
+                usage = dict.fromkeys(USAGE_FIELDS, 0) if cached is None else cached["usage"]
+            cached = {"prev_time": time.time(), "usage": usage}
+            with self.lock:
+                self.totals[key] = cached
+        with self.lock:
+            pending = self.pending.get(key, {})
+            return {field: cached["usage"][field] + pending.get(field, 0) for field in USAGE_FIELDS}
+
+    def ensure_running(self):
+        """
+        Start the flush thread once per process, threads do not survive a fork
+        :return: None
+        """
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.pending = dict()
+            self.totals = dict()
+            self.thread = threading.Thread(target=self.run, name="usage-flusher", daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+            logger.info("started usage flush thread")
+
+    def run(self):
+        """
+        Flush loop
+        :return: None
+        """
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("failed to flush usage counters")
+
+    def flush(self):
+        """
+        Write the local counters to database with one $inc per user and
+        refresh the totals of the flushed users, counters which fail to
+        write are kept for the next flush
+        :return: None
+        """
+        with self.lock:
+            pending, self.pending = self.pending, dict()
+            today = get_usage_day()
+            self.totals = {key: value for key, value in self.totals.items() if key[1] == today}
+        if not pending:
+            return
+        logger.debug("flushing usage counters for %s users", len(pending))
+        flushed_keys = []
+        for key in list(pending):
+            try:
+                run_update_one_query(config.USAGE_COL, {"user_id": key[0], "day": key[1]},
+                                     {"$inc": pending[key]}, upsert=True)
+            except Exception:
+                self.restore(pending)
+                raise
+            pending.pop(key)
+            flushed_keys.append(key)
+        self.refresh_totals(flushed_keys)
+
+    def refresh_totals(self, keys):
+        """
+        Read the totals of the given keys again after their usage is flushed,
+        keys which can not be read are dropped so they are read on next use
+        :param keys: list
+        :return: None
+        """
+        for index, key in enumerate(keys):
+            try:
+                cached = {"prev_time": time.time(), "usage": read_usage(*key)}
+            except Exception:
+                logger.exception("failed to read usage totals after flush")
+                with self.lock:
+                    for failed_key in keys[index:]:
+                        self.totals.pop(failed_key, None)
+                return
+            with self.lock:
+                if key[1] == get_usage_day():
+                    self.totals[key] = cached
+
+    def restore(self, pending):
+        """
+        Merge the counters which could not be flushed back into the local counters
+        :param pending: dict
+        :return: None
+        """
+        with self.lock:
+            for key, counters in pending.items():
+                merged = self.pending.setdefault(key, dict.fromkeys(USAGE_FIELDS, 0))
+                for field in USAGE_FIELDS:
+                    merged[field] += counters[field]
+
+
+def get_usage_day():
+    """
+    Get the current day used as usage key
+    :return: str
+    """
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def read_usage(user_id, day):
+    """
+    Read the usage of the given user for the given day from database
+    :param user_id: str
+    :param day: str
+    :return: dict
+    """
+    find_query = {"user_id": user_id, "day": day}
+    project_query = {"_id": 0, "lookups": 1, "bytes_proxied": 1}
+    result = run_find_one_query(config.USAGE_COL, find_query, project_query, error=False)
+    if result is None:
+        result = dict()
+    return {field: result.get(field, 0) for field in USAGE_FIELDS}
+
+
+def get_usage_key():
+    """
+    Get the usage key of the current request, user id for logged in users
+    and client ip address for anonymous clients
+    :return: str
+    """
+    if current_user.is_authenticated:
+        return current_user.id
+    return f"{ANON_USAGE_KEY_PREFIX}{request.remote_addr}"
+
+
+def get_usage_limits(usage_key):
+    """
+    Get the daily limits for the given usage key
+    :param usage_key: str
+    :return: dict
+    """
+    if usage_key.startswith(ANON_USAGE_KEY_PREFIX):
+        return {"lookups": config.ANON_DAILY_LOOKUP_LIMIT,
+                "bytes_proxied": config.ANON_DAILY_BYTES_LIMIT}
+    return {"lookups": config.DAILY_LOOKUP_LIMIT, "bytes_proxied": config.DAILY_BYTES_LIMIT}
+
+
+def check_usage_limit(usage_key, field):
+    """
+    Raise error if the given usage key has used up the daily limit of the given field
+    :param usage_key: str
+    :param field: str
+    :return: None || Exception
+    """
+    if usage_counter.get_usage(usage_key)[field] >= get_usage_limits(usage_key)[field]:
+        raise CustomException(USAGE_LIMIT_ERR_MSGS[field], 429)
+
+
+usage_counter = UsageCounter(config.USAGE_FLUSH_INTERVAL)
@@ -0,0 +1,89 @@
+import re
+import threading
+import config
+from log import get_logger
+
+logger = get_logger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class VideoSearchIndex:
+    """
+    In-process inverted index over titles and descriptions of extracted videos,
+    the least recently added videos are dropped once max_size is reached
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: int
+        maximum number of videos kept in the index
+        """
+        self.max_size = max_size
+        self.videos = dict()
+        self.index = dict()
+        self.prev_time = 0
+        self.last_extracted_at = 0
+        self.lock = threading.Lock()
+
+    def add_video(self, video_details):
+        """
+        Add or replace the given video details in the index
+        :param video_details: dict
+        :return: None
+        """
+        video_id = video_details["id"]
+        words = get_words(video_details.get("title")) | get_words(video_details.get("description"))
+        with self.lock:
+            self.remove_video(video_id)
+            self.videos[video_id] = video_details
+            for word in words:
+                self.index.setdefault(word, set()).add(video_id)
+            while len(self.videos) > self.max_size:
+                self.remove_video(next(iter(self.videos)))
+
+    def remove_video(self, video_id):
+        """
+        Remove the given video from the index, caller must hold the lock
+        :param video_id: str
+        :return: None
+        """
+        old_details = self.videos.pop(video_id, None)
+        if old_details is None:
+            return
+        old_words = get_words(old_details.get("title")) | get_words(old_details.get("description"))
+        for word in old_words:
+            video_ids = self.index.get(word)
+            if video_ids is not None:
+                video_ids.discard(video_id)
+                if not video_ids:
+                    self.index.pop(word, None)
+
+    def search(self, query, limit):
+        """
+        Get videos matching the query, ranked by the number of matched words
+        :param query: str
+        :param limit: int
+        :return: list
+        """
+        scores = dict()
+        with self.lock:
+            for word in get_words(query):
+                for video_id in self.index.get(word, ()):
+                    scores[video_id] = scores.get(video_id, 0) + 1
+            ranked_ids = sorted(scores, key=scores.get, reverse=True)[:limit]
+            return [self.videos[video_id] for video_id in ranked_ids]
+
+
+def get_words(text):
+    """
+    Get the set of lower cased words in the given text
+    :param text: str
+    :return: set
+    """
+    if not text:
+        return set()
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+video_search_index = VideoSearchIndex(config.SEARCH_INDEX_SIZE)